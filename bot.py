@@ -1,16 +1,26 @@
 import asyncio
+import copy
 import logging
 import os
+import shutil
+import stat
 import sys
+import threading
 import time
-from collections import defaultdict
-from typing import Optional
-from urllib.parse import urlparse
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
+from functools import lru_cache
+from typing import Optional, Union
+from urllib.parse import urlsplit
 from uuid import uuid4
 
 import yt_dlp
 from telegram import Update
+from telegram.error import BadRequest
 from telegram.ext import (
+    AIORateLimiter,
+    Application,
     ApplicationBuilder,
     CommandHandler,
     ContextTypes,
@@ -34,22 +44,80 @@ def get_env_int(name: str, default: int) -> int:
         raise RuntimeError(f"{name} должен быть числом") from exc
 
 
+def default_download_dir() -> str:
+    try:
+        tmpfs_free = shutil.disk_usage(TMPFS_DIR).free
+    except OSError:
+        return "downloads"
+
+    if tmpfs_free < TMPFS_MIN_FREE or not os.access(TMPFS_DIR, os.W_OK):
+        return "downloads"
+
+    path = os.path.join(TMPFS_DIR, f"tgvdbot-{os.getuid()}")
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    except OSError:
+        return "downloads"
+
+    try:
+        path_stat = os.lstat(path)
+    except OSError:
+        return "downloads"
+
+    if not stat.S_ISDIR(path_stat.st_mode) or path_stat.st_uid != os.getuid():
+        return "downloads"
+    return path
+
+
+TMPFS_DIR = "/dev/shm"
+TMPFS_MIN_FREE = 200 * 1024 * 1024
+
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 if not TELEGRAM_BOT_TOKEN:
     raise RuntimeError("TELEGRAM_BOT_TOKEN не задан")
 
 OWNER_ID = get_env_int("OWNER_ID", 0)
-DOWNLOAD_DIR = os.getenv("DOWNLOAD_DIR", "downloads")
+DOWNLOAD_DIR = os.getenv("DOWNLOAD_DIR") or default_download_dir()
 MAX_FILE_SIZE = get_env_int("MAX_FILE_SIZE", 50 * 1024 * 1024)
 MAX_PARALLEL_DOWNLOADS = get_env_int("MAX_PARALLEL_DOWNLOADS", 3)
+MAX_QUEUED_DOWNLOADS = get_env_int("MAX_QUEUED_DOWNLOADS", MAX_PARALLEL_DOWNLOADS * 2)
 RATE_LIMIT_REQUESTS = get_env_int("RATE_LIMIT_REQUESTS", 5)
 RATE_LIMIT_WINDOW = get_env_int("RATE_LIMIT_WINDOW", 60)
 INSTAGRAM_COOKIES = os.getenv("INSTAGRAM_COOKIES", "/app/cookies/instagram.txt")
+CLEANUP_INTERVAL = 5 * 60
+STALE_FILE_AGE = 10 * 60
+CLEANUP_BATCH_DELAY = 0.1
+MAX_TRACKED_USERS = 10_000
+UPLOAD_TIMEOUT = 5 * 60
+STATUS_DELAY = 3
+STATUS_MIN_INTERVAL = 1
+MAX_CACHED_VIDEOS = 1000
+QUEUE_FULL_MESSAGE = "Сейчас много загрузок, попробуй через минуту."
+DOWNLOAD_FAILED_MESSAGE = "Не удалось скачать видео. Попробуй другую ссылку позже."
 
 os.makedirs(DOWNLOAD_DIR, exist_ok=True)
 
 X_HOSTS = {"twitter.com", "www.twitter.com", "x.com", "www.x.com", "t.co"}
 INSTAGRAM_HOSTS = {"instagram.com", "www.instagram.com", "m.instagram.com"}
+PLATFORM_HOSTS = {
+    **dict.fromkeys(X_HOSTS, "x"),
+    **dict.fromkeys(INSTAGRAM_HOSTS, "instagram"),
+}
+
+FORMAT_ATTEMPTS = (
+    (
+        f"best[ext=mp4][filesize<={MAX_FILE_SIZE}]"
+        f"/best[ext=mp4][filesize_approx<={MAX_FILE_SIZE}]"
+        f"/best[filesize<={MAX_FILE_SIZE}]"
+        f"/best[filesize_approx<={MAX_FILE_SIZE}]"
+        "/best[ext=mp4]"
+    ),
+    "best[height<=1080][ext=mp4]/best[height<=1080]",
+    "best[height<=720][ext=mp4]/best[height<=720]",
+    "best[height<=540][ext=mp4]/best[height<=540]",
+)
 
 # =======================
 # LOGGING
@@ -71,8 +139,44 @@ logging.getLogger("yt_dlp").setLevel(logging.ERROR)
 # GLOBALS
 # =======================
 
-DOWNLOAD_SEMAPHORE = asyncio.Semaphore(MAX_PARALLEL_DOWNLOADS)
-LAST_REQUESTS: dict[int, list[float]] = defaultdict(list)
+
+class DownloadSlots:
+    def __init__(self, limit: int, max_waiting: int):
+        self._semaphore = asyncio.Semaphore(limit)
+        self._capacity = limit + max_waiting
+        self._reserved = 0
+
+    def is_full(self) -> bool:
+        return self._reserved >= self._capacity
+
+    def try_reserve(self) -> bool:
+        if self.is_full():
+            return False
+        self._reserved += 1
+        return True
+
+    async def __aenter__(self):
+        try:
+            await self._semaphore.acquire()
+        except asyncio.CancelledError:
+            self._reserved -= 1
+            raise
+
+    async def __aexit__(self, *exc_info):
+        self._semaphore.release()
+        self._reserved -= 1
+
+
+DOWNLOAD_SLOTS = DownloadSlots(MAX_PARALLEL_DOWNLOADS, MAX_QUEUED_DOWNLOADS)
+DOWNLOAD_EXECUTOR = ThreadPoolExecutor(
+    max_workers=MAX_PARALLEL_DOWNLOADS,
+    thread_name_prefix="download",
+)
+YDL_INSTANCES = threading.local()
+BACKGROUND_TASKS: set[asyncio.Task] = set()
+CLEANUP_QUEUE: asyncio.Queue[str] = asyncio.Queue()
+LAST_REQUESTS: OrderedDict[int, deque[float]] = OrderedDict()
+SENT_VIDEOS: OrderedDict[str, str] = OrderedDict()
 
 STATS = {
     "total": 0,
@@ -87,37 +191,81 @@ class UserFacingError(Exception):
     pass
 
 
+class FileTooLargeError(Exception):
+    pass
+
+
 # =======================
 # HELPERS
 # =======================
 
 
 def parse_platform(url: str) -> Optional[str]:
+    if not url[:8].lower().startswith(("http://", "https://")):
+        return None
+    return resolve_platform(url)
+
+
+@lru_cache(maxsize=4096)
+def resolve_platform(url: str) -> Optional[str]:
     try:
-        parsed = urlparse(url)
+        parsed = urlsplit(url)
     except ValueError:
         return None
 
-    if parsed.scheme not in {"http", "https"}:
+    if parsed.scheme not in ("http", "https"):
         return None
 
-    host = (parsed.hostname or "").lower()
-    if host in INSTAGRAM_HOSTS:
-        return "instagram"
-    if host in X_HOSTS:
-        return "x"
-    return None
+    return PLATFORM_HOSTS.get(parsed.hostname or "")
 
 
-def is_allowed(user_id: int) -> tuple[bool, Optional[int]]:
-    now = time.time()
-    LAST_REQUESTS[user_id] = [t for t in LAST_REQUESTS[user_id] if now - t < RATE_LIMIT_WINDOW]
+def video_cache_key(url: str, platform: str) -> str:
+    return f"{platform}:{urlsplit(url).path.rstrip('/')}"
+
+
+def get_cached_video(cache_key: str) -> Optional[str]:
+    file_id = SENT_VIDEOS.get(cache_key)
+    if file_id is not None:
+        SENT_VIDEOS.move_to_end(cache_key)
+    return file_id
+
+
+def remember_video(cache_key: str, file_id: str):
+    SENT_VIDEOS[cache_key] = file_id
+    SENT_VIDEOS.move_to_end(cache_key)
+    if len(SENT_VIDEOS) > MAX_CACHED_VIDEOS:
+        SENT_VIDEOS.popitem(last=False)
 
-    if len(LAST_REQUESTS[user_id]) >= RATE_LIMIT_REQUESTS:
-        wait = int(RATE_LIMIT_WINDOW - (now - LAST_REQUESTS[user_id][0]))
+
+def count_request(user_id: int, platform: str):
+    STATS["total"] += 1
+    STATS["users"].add(user_id)
+    STATS[platform] += 1
+
+
+def remove_file(filepath: str):
+    with suppress(FileNotFoundError):
+        os.unlink(filepath)
+
+
+def is_allowed(user_id: int) -> tuple[bool, Optional[int]]:
+    now = time.monotonic()
+    requests = LAST_REQUESTS.get(user_id)
+    if requests is None:
+        requests = LAST_REQUESTS[user_id] = deque(maxlen=RATE_LIMIT_REQUESTS)
+        if len(LAST_REQUESTS) > MAX_TRACKED_USERS:
+            LAST_REQUESTS.popitem(last=False)
+    else:
+        LAST_REQUESTS.move_to_end(user_id)
+
+    while requests and now - requests[0] >= RATE_LIMIT_WINDOW:
+        requests.popleft()
+
+    if len(requests) >= RATE_LIMIT_REQUESTS:
+        wait = int(RATE_LIMIT_WINDOW - (now - requests[0]))
         return False, max(1, wait)
 
-    LAST_REQUESTS[user_id].append(now)
+    requests.append(now)
     return True, None
 
 
@@ -126,13 +274,29 @@ def is_allowed(user_id: int) -> tuple[bool, Optional[int]]:
 # =======================
 
 
-def build_ydl_opts(outtmpl: str, is_instagram: bool, format_selector: str) -> dict:
+def reject_oversize(info: dict, *, incomplete: bool) -> None:
+    if incomplete:
+        return
+
+    size = info.get("filesize") or info.get("filesize_approx")
+    if size and size > MAX_FILE_SIZE:
+        raise FileTooLargeError(f"format {info.get('format_id')} is {size} bytes")
+
+
+def build_ydl_opts(is_instagram: bool, format_selector: str) -> dict:
     ydl_opts: dict = {
-        "outtmpl": outtmpl,
         "format": format_selector,
         "merge_output_format": "mp4",
         "noplaylist": True,
         "quiet": True,
+        "noprogress": True,
+        "retries": 2,
+        "fragment_retries": 2,
+        "concurrent_fragment_downloads": 4,
+        "socket_timeout": 15,
+        "match_filter": reject_oversize,
+        "max_filesize": MAX_FILE_SIZE,
+        "updatetime": False,
         "user_agent": (
             "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
             "AppleWebKit/537.36 (KHTML, like Gecko) "
@@ -146,11 +310,60 @@ def build_ydl_opts(outtmpl: str, is_instagram: bool, format_selector: str) -> di
     return ydl_opts
 
 
-def download_with_format(url: str, outtmpl: str, is_instagram: bool, format_selector: str) -> str:
-    ydl_opts = build_ydl_opts(outtmpl, is_instagram, format_selector)
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        info = ydl.extract_info(url, download=True)
-        return info.get("_filename") or ydl.prepare_filename(info)
+def get_cookies_mtime() -> Optional[float]:
+    try:
+        return os.stat(INSTAGRAM_COOKIES).st_mtime
+    except OSError:
+        return None
+
+
+def close_ydl(ydl: yt_dlp.YoutubeDL):
+    ydl.params["cookiefile"] = None
+    ydl.close()
+
+
+def get_ydl(is_instagram: bool, format_selector: str) -> yt_dlp.YoutubeDL:
+    instances = getattr(YDL_INSTANCES, "instances", None)
+    if instances is None:
+        instances = YDL_INSTANCES.instances = {}
+
+    key = (is_instagram, format_selector)
+    cookies_mtime = get_cookies_mtime() if is_instagram else None
+    cached = instances.get(key)
+    if cached is None or cached[0] != cookies_mtime:
+        if cached is not None:
+            close_ydl(cached[1])
+        cached = instances[key] = (
+            cookies_mtime,
+            yt_dlp.YoutubeDL(build_ydl_opts(is_instagram, format_selector)),
+        )
+    return cached[1]
+
+
+def extract_source(url: str, is_instagram: bool, format_selector: str) -> Union[str, dict]:
+    info = get_ydl(is_instagram, format_selector).extract_info(url, download=False, process=False)
+    if info.get("_type", "video") != "video":
+        return url
+    return info
+
+
+def download_with_format(
+    source: Union[str, dict],
+    outtmpl: str,
+    is_instagram: bool,
+    format_selector: str,
+) -> str:
+    ydl = get_ydl(is_instagram, format_selector)
+    ydl.params["outtmpl"]["default"] = outtmpl
+    if isinstance(source, dict):
+        info = ydl.process_ie_result(copy.deepcopy(source), download=True)
+    else:
+        info = ydl.extract_info(source, download=True)
+
+    downloads = info.get("requested_downloads")
+    if downloads and downloads[0].get("filepath"):
+        return downloads[0]["filepath"]
+    return info.get("_filename") or ydl.prepare_filename(info)
 
 
 def download_video(url: str, user_id: int, platform: str) -> str:
@@ -159,28 +372,21 @@ def download_video(url: str, user_id: int, platform: str) -> str:
 
     logger.info("[user=%s] download start platform=%s url=%s", user_id, platform, url)
 
-    format_attempts = [
-        (
-            f"best[ext=mp4][filesize<={MAX_FILE_SIZE}]"
-            f"/best[ext=mp4][filesize_approx<={MAX_FILE_SIZE}]"
-            f"/best[filesize<={MAX_FILE_SIZE}]"
-            f"/best[filesize_approx<={MAX_FILE_SIZE}]"
-            "/best[ext=mp4]"
-        ),
-        "best[height<=1080][ext=mp4]/best[height<=1080]",
-        "best[height<=720][ext=mp4]/best[height<=720]",
-        "best[height<=540][ext=mp4]/best[height<=540]",
-    ]
-
+    source: Optional[Union[str, dict]] = None
     last_error: Optional[Exception] = None
     oversize_detected = False
-    for attempt_index, format_selector in enumerate(format_attempts, start=1):
+    for attempt_index, format_selector in enumerate(FORMAT_ATTEMPTS, start=1):
         outtmpl = f"{DOWNLOAD_DIR}/video_{user_id}_{unique_id}_a{attempt_index}.%(ext)s"
         filepath: Optional[str] = None
 
         try:
-            filepath = download_with_format(url, outtmpl, is_instagram, format_selector)
-            size = os.path.getsize(filepath)
+            if source is None:
+                source = extract_source(url, is_instagram, format_selector)
+            filepath = download_with_format(source, outtmpl, is_instagram, format_selector)
+            try:
+                size = os.path.getsize(filepath)
+            except FileNotFoundError as exc:
+                raise FileTooLargeError("download aborted by max_filesize") from exc
             logger.info(
                 "[user=%s] attempt=%s downloaded %.1f MB",
                 user_id,
@@ -189,17 +395,17 @@ def download_video(url: str, user_id: int, platform: str) -> str:
             )
 
             if size <= MAX_FILE_SIZE:
-                STATS["total"] += 1
-                STATS["users"].add(user_id)
-                STATS[platform] += 1
                 return filepath
 
             oversize_detected = True
-            os.remove(filepath)
+            remove_file(filepath)
+        except FileTooLargeError as exc:
+            oversize_detected = True
+            logger.info("[user=%s] attempt=%s skipped: %s", user_id, attempt_index, exc)
         except Exception as exc:
             last_error = exc
-            if filepath and os.path.exists(filepath):
-                os.remove(filepath)
+            if filepath:
+                remove_file(filepath)
             logger.info("[user=%s] attempt=%s failed", user_id, attempt_index)
 
     if oversize_detected:
@@ -212,6 +418,90 @@ def download_video(url: str, user_id: int, platform: str) -> str:
     raise UserFacingError("Не удалось скачать видео.")
 
 
+async def fetch_video(url: str, user_id: int, platform: str) -> str:
+    async with DOWNLOAD_SLOTS:
+        return await asyncio.get_running_loop().run_in_executor(
+            DOWNLOAD_EXECUTOR, download_video, url, user_id, platform
+        )
+
+
+def discard_download(download: asyncio.Task):
+    if not download.cancelled() and download.exception() is None:
+        CLEANUP_QUEUE.put_nowait(download.result())
+
+
+def read_file(filepath: str) -> bytes:
+    with open(filepath, "rb") as file_obj:
+        return file_obj.read()
+
+
+# =======================
+# CLEANUP
+# =======================
+
+
+def remove_stale_downloads() -> int:
+    deadline = time.time() - STALE_FILE_AGE
+    removed = 0
+    with os.scandir(DOWNLOAD_DIR) as entries:
+        for entry in entries:
+            with suppress(FileNotFoundError):
+                if (
+                    entry.name.startswith("video_")
+                    and entry.is_file()
+                    and entry.stat().st_mtime <= deadline
+                ):
+                    remove_file(entry.path)
+                    removed += 1
+    return removed
+
+
+async def cleanup_downloads():
+    while True:
+        try:
+            removed = await asyncio.to_thread(remove_stale_downloads)
+        except OSError:
+            logger.exception("Failed to clean up %s", DOWNLOAD_DIR)
+        else:
+            if removed:
+                logger.info("Removed %s stale files from %s", removed, DOWNLOAD_DIR)
+        await asyncio.sleep(CLEANUP_INTERVAL)
+
+
+def remove_files(filepaths: list[str]):
+    for filepath in filepaths:
+        try:
+            remove_file(filepath)
+        except OSError:
+            logger.exception("Failed to remove %s", filepath)
+
+
+def drain_cleanup_queue() -> list[str]:
+    filepaths = []
+    while not CLEANUP_QUEUE.empty():
+        filepaths.append(CLEANUP_QUEUE.get_nowait())
+    return filepaths
+
+
+async def process_cleanup_queue():
+    while True:
+        filepaths = [await CLEANUP_QUEUE.get()]
+        try:
+            await asyncio.sleep(CLEANUP_BATCH_DELAY)
+            filepaths.extend(drain_cleanup_queue())
+        finally:
+            await asyncio.to_thread(remove_files, filepaths)
+
+
+async def prune_rate_limits():
+    while True:
+        await asyncio.sleep(CLEANUP_INTERVAL)
+        now = time.monotonic()
+        for user_id, requests in list(LAST_REQUESTS.items()):
+            if not requests or now - requests[-1] >= RATE_LIMIT_WINDOW:
+                del LAST_REQUESTS[user_id]
+
+
 # =======================
 # HANDLERS
 # =======================
@@ -246,6 +536,14 @@ async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
 
+async def safe_reply(message, text: str):
+    try:
+        return await message.reply_text(text)
+    except Exception:
+        logger.warning("Failed to send status message")
+        return None
+
+
 async def safe_edit_status(status_message, text: str):
     try:
         await status_message.edit_text(text)
@@ -253,6 +551,20 @@ async def safe_edit_status(status_message, text: str):
         logger.warning("Failed to edit status message")
 
 
+async def safe_delete_status(status_message):
+    try:
+        await status_message.delete()
+    except Exception:
+        logger.warning("Failed to delete status message")
+
+
+async def report_status(message, status_message, text: str):
+    if status_message is None:
+        await safe_reply(message, text)
+    else:
+        await safe_edit_status(status_message, text)
+
+
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     del context
     if not update.message or not update.effective_user:
@@ -265,35 +577,81 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if platform is None:
         return
 
+    cache_key = video_cache_key(url, platform)
+    cached_file_id = get_cached_video(cache_key)
+    if cached_file_id is None and DOWNLOAD_SLOTS.is_full():
+        await update.message.reply_text(QUEUE_FULL_MESSAGE)
+        return
+
     allowed, wait = is_allowed(user_id)
     if not allowed:
         await update.message.reply_text(f"Подожди {wait} сек.")
         return
 
-    status = await update.message.reply_text("Загружаю...")
+    if cached_file_id is not None:
+        try:
+            await update.message.reply_video(cached_file_id, supports_streaming=True)
+        except BadRequest:
+            logger.warning("[user=%s] cached video %s rejected, downloading again", user_id, cache_key)
+            SENT_VIDEOS.pop(cache_key, None)
+        except Exception:
+            STATS["errors"] += 1
+            logger.exception("[user=%s] failed to send cached video", user_id)
+            await safe_reply(update.message, DOWNLOAD_FAILED_MESSAGE)
+            return
+        else:
+            count_request(user_id, platform)
+            logger.info("[user=%s] sent from cache", user_id)
+            return
+
+    if not DOWNLOAD_SLOTS.try_reserve():
+        await update.message.reply_text(QUEUE_FULL_MESSAGE)
+        return
+
+    download = asyncio.create_task(fetch_video(url, user_id, platform))
+    status = None
+    status_shown_at = 0.0
     filepath: Optional[str] = None
 
     try:
-        async with DOWNLOAD_SEMAPHORE:
-            filepath = await asyncio.to_thread(download_video, url, user_id, platform)
-
-        await safe_edit_status(status, "Отправляю...")
-        with open(filepath, "rb") as file_obj:
-            await update.message.reply_video(file_obj, supports_streaming=True)
+        done, _ = await asyncio.wait({download}, timeout=STATUS_DELAY)
+        if not done:
+            status = await safe_reply(update.message, "Загружаю...")
+            status_shown_at = time.monotonic()
+        filepath = await asyncio.shield(download)
+
+        count_request(user_id, platform)
+
+        if status is not None and time.monotonic() - status_shown_at >= STATUS_MIN_INTERVAL:
+            await safe_edit_status(status, "Отправляю...")
+        video = await asyncio.to_thread(read_file, filepath)
+        sent = await update.message.reply_video(
+            video,
+            filename=os.path.basename(filepath),
+            supports_streaming=True,
+            read_timeout=UPLOAD_TIMEOUT,
+            write_timeout=UPLOAD_TIMEOUT,
+        )
+        if sent.video:
+            remember_video(cache_key, sent.video.file_id)
 
         logger.info("[user=%s] sent", user_id)
+        if status is not None:
+            await safe_delete_status(status)
 
     except UserFacingError as exc:
         STATS["errors"] += 1
         logger.info("[user=%s] user-facing error: %s", user_id, exc)
-        await safe_edit_status(status, str(exc))
+        await report_status(update.message, status, str(exc))
     except Exception:
         STATS["errors"] += 1
         logger.exception("[user=%s] unexpected error", user_id)
-        await safe_edit_status(status, "Не удалось скачать видео. Попробуй другую ссылку позже.")
+        await report_status(update.message, status, DOWNLOAD_FAILED_MESSAGE)
     finally:
-        if filepath and os.path.exists(filepath):
-            os.remove(filepath)
+        if filepath:
+            CLEANUP_QUEUE.put_nowait(filepath)
+        else:
+            download.add_done_callback(discard_download)
 
 
 # =======================
@@ -301,10 +659,34 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # =======================
 
 
-def main():
-    logger.info("Bot started")
+async def post_init(app: Application):
+    del app
+    BACKGROUND_TASKS.add(asyncio.create_task(cleanup_downloads()))
+    BACKGROUND_TASKS.add(asyncio.create_task(prune_rate_limits()))
+    BACKGROUND_TASKS.add(asyncio.create_task(process_cleanup_queue()))
+
+
+async def post_stop(app: Application):
+    del app
+    for task in BACKGROUND_TASKS:
+        task.cancel()
+    await asyncio.gather(*BACKGROUND_TASKS, return_exceptions=True)
+    BACKGROUND_TASKS.clear()
+    remove_files(drain_cleanup_queue())
 
-    app = ApplicationBuilder().token(TELEGRAM_BOT_TOKEN).build()
+
+def main():
+    logger.info("Bot started, downloads in %s", DOWNLOAD_DIR)
+
+    app = (
+        ApplicationBuilder()
+        .token(TELEGRAM_BOT_TOKEN)
+        .rate_limiter(AIORateLimiter(max_retries=3))
+        .concurrent_updates(True)
+        .post_init(post_init)
+        .post_stop(post_stop)
+        .build()
+    )
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("stats", stats))
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))